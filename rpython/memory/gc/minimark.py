@@ -6,6 +6,12 @@ Environment variables can be used to fine-tune the following parameters:
                          '4M'.  Small values
                          (like 1 or 1KB) are useful for debugging.
 
+ PYPY_GC_NURSERY_MIN_RATIO  If set to N, then after a major collection
+                         the nursery is grown if needed to be at least 1/N
+                         of the next major collection threshold (but not
+                         more than '64M').  Try values like '32'.  By
+                         default, the nursery is never grown.
+
  PYPY_GC_NURSERY_CLEANUP The interval at which nursery is cleaned up. Must
                          be smaller than the nursery size and bigger than the
                          biggest object we can allotate in the nursery.
@@ -57,7 +63,8 @@ from rpython.memory.support import mangle_hash
 from rpython.rlib.rarithmetic import ovfcheck, LONG_BIT, intmask, r_uint
 from rpython.rlib.rarithmetic import LONG_BIT_SHIFT
 from rpython.rlib.debug import ll_assert, debug_print, debug_start, debug_stop
-from rpython.rlib.objectmodel import specialize
+from rpython.rlib.objectmodel import specialize, unlikely
+from rpython.rlib.objectmodel import we_are_translated_to_c
 
 
 #
@@ -68,7 +75,10 @@ from rpython.rlib.objectmodel import specialize
 #    4MB by default.  When full, we do a minor collection;
 #    the surviving objects from the nursery are moved outside, and the
 #    non-surviving raw-malloced objects are freed.  All surviving objects
-#    become old.
+#    become old.  Allocation in the nursery is done by bumping a single
+#    pointer, 'nursery_free'; there are no per-size free lists, because
+#    the nursery is emptied as a whole at every minor collection and
+#    objects allocated together are then also adjacent in memory.
 #
 #  * old objects: never move again.  These objects are either allocated by
 #    minimarkpage.py (if they are small), or raw-malloced (if they are not
@@ -128,12 +138,26 @@ GCFLAG_DUMMY        = first_gcflag << 8
 
 _GCFLAG_FIRST_UNUSED = first_gcflag << 9    # the first unused bit
 
+# the bit numbers of the two flags that give the finalization state
+_VISITED_BIT = LONG_BIT//2 + 2
+_FINALIZATION_ORDERING_BIT = LONG_BIT//2 + 4
+assert GCFLAG_VISITED == 1 << _VISITED_BIT
+assert GCFLAG_FINALIZATION_ORDERING == 1 << _FINALIZATION_ORDERING_BIT
+
 
 FORWARDSTUB = lltype.GcStruct('forwarding_stub',
                               ('forw', llmemory.Address))
 FORWARDSTUBPTR = lltype.Ptr(FORWARDSTUB)
 NURSARRAY = lltype.Array(llmemory.Address)
 
+# For each non-zero card byte, the index of its lowest set bit
+def _lowest_bit_index(n):
+    i = 0
+    while n and not (n & (1 << i)):
+        i += 1
+    return i
+CARD_BYTE_LOWEST_BIT = [_lowest_bit_index(_n) for _n in range(256)]
+
 # ____________________________________________________________
 
 class MiniMarkGC(MovingGCBase):
@@ -164,6 +188,12 @@ class MiniMarkGC(MovingGCBase):
     # nursery don't need to.
     minimal_size_in_nursery = (
         llmemory.sizeof(HDR) + llmemory.sizeof(llmemory.Address))
+    # the same as a number of bytes, i.e. a constant and not a symbolic
+    min_nursery_alloc_size = raw_malloc_usage(minimal_size_in_nursery)
+
+    # objects copied out of the nursery that are larger than this are
+    # traced last during a minor collection (see collect_oldrefs_to_nursery)
+    large_copied_object_size = 256
 
 
     TRANSLATION_PARAMS = {
@@ -176,6 +206,14 @@ class MiniMarkGC(MovingGCBase):
         # fall-back number.
         "nursery_size": 896*1024,
 
+        # After a major collection, the nursery is grown if it is smaller
+        # than 1/heap_to_nursery_ratio of the next major collection
+        # threshold, up to max_nursery_size.  Large heaps then do fewer
+        # minor collections.  A value of 0 disables this; it is the
+        # default, and PYPY_GC_NURSERY_MIN_RATIO can enable it.
+        "heap_to_nursery_ratio": 0.0,
+        "max_nursery_size": 64*1024*1024,
+
         # The system page size.  Like malloc, we assume that it is 4K
         # for 32-bit systems; unlike malloc, we assume that it is 8K
         # for 64-bit systems, for consistent results.
@@ -228,6 +266,8 @@ class MiniMarkGC(MovingGCBase):
                  read_from_env=False,
                  nursery_size=32*WORD,
                  nursery_cleanup=9*WORD,
+                 heap_to_nursery_ratio=0.0,
+                 max_nursery_size=0,
                  page_size=16*WORD,
                  arena_size=64*WORD,
                  small_request_threshold=5*WORD,
@@ -242,6 +282,9 @@ class MiniMarkGC(MovingGCBase):
         self.read_from_env = read_from_env
         self.nursery_size = nursery_size
         self.nursery_cleanup = nursery_cleanup
+        self.heap_to_nursery_ratio = heap_to_nursery_ratio
+        self.max_nursery_size = max_nursery_size
+        self.wanted_nursery_size = 0
         self.small_request_threshold = small_request_threshold
         self.major_collection_threshold = major_collection_threshold
         self.growth_rate_max = growth_rate_max
@@ -256,11 +299,18 @@ class MiniMarkGC(MovingGCBase):
             self.card_page_shift = 0
             while (1 << self.card_page_shift) < self.card_page_indices:
                 self.card_page_shift += 1
+            # card_marking_{words,bytes}_for_length() use only shifts
+            assert (1 << self.card_page_shift) == self.card_page_indices, (
+                "card_page_indices must be a power of two")
         #
         # 'large_object' limit how big objects can be in the nursery, so
         # it gives a lower bound on the allowed size of the nursery.
         self.nonlarge_max = large_object - 1
         #
+        # Note that the fields of the translated GC are laid out sorted by
+        # name.  'nursery_free' and 'nursery_top' are used by every inlined
+        # malloc, so they should share a cache line: avoid adding more
+        # fields whose name sorts between them.
         self.nursery      = NULL
         self.nursery_free = NULL
         self.nursery_top  = NULL
@@ -285,6 +335,14 @@ class MiniMarkGC(MovingGCBase):
         # minor collection.
         self.old_objects_pointing_to_young = self.AddressStack()
         #
+        # Only used during a minor collection: the objects copied out of
+        # the nursery that are larger than 'large_copied_object_size'
+        # go here instead of in 'old_objects_pointing_to_young'.  They
+        # are traced breadth-first, only when the stack above is empty,
+        # so that the small objects copied while tracing one object
+        # stay close to it.
+        self.old_objects_pointing_to_young_large = self.AddressDeque()
+        #
         # Similar to 'old_objects_pointing_to_young', but lists objects
         # that have the GCFLAG_CARDS_SET bit.  For large arrays.  Note
         # that it is possible for an object to be listed both in here
@@ -336,6 +394,10 @@ class MiniMarkGC(MovingGCBase):
         # GCFLAG_HAS_SHADOW to their future location at the next
         # minor collection.
         self.nursery_objects_shadows = self.AddressDict()
+        # A one-entry cache in front of it: id() or hash() is often
+        # asked repeatedly for the same object.
+        self.last_shadow_obj = NULL
+        self.last_shadow = NULL
         #
         # Allocate a nursery.  In case of auto_nursery_size, start by
         # allocating a very small nursery, enough to do things like look
@@ -367,7 +429,12 @@ class MiniMarkGC(MovingGCBase):
             if newsize < minsize:
                 self.debug_tiny_nursery = newsize & ~(WORD-1)
                 newsize = minsize
-
+            #
+            nursery_ratio = env.read_float_from_env(
+                'PYPY_GC_NURSERY_MIN_RATIO')
+            if nursery_ratio > 0.0:
+                self.heap_to_nursery_ratio = nursery_ratio
+            #
             nurs_cleanup = env.read_from_env('PYPY_GC_NURSERY_CLEANUP')
             if nurs_cleanup > 0:
                 self.nursery_cleanup = nurs_cleanup
@@ -397,13 +464,19 @@ class MiniMarkGC(MovingGCBase):
             else:
                 self.max_delta = 0.125 * env.get_total_memory()
             #
-            self.minor_collection()    # to empty the nursery
+            # empty the nursery, if reading the env vars allocated anything
+            if (self.nursery_free != self.nursery or
+                    self.young_rawmalloced_objects):
+                self.minor_collection()
             llarena.arena_free(self.nursery)
             self.nursery_size = newsize
             self.allocate_nursery()
         #
         if self.nursery_cleanup < self.nonlarge_max + 1:
             self.nursery_cleanup = self.nonlarge_max + 1
+        self._set_initial_cleanup()
+
+    def _set_initial_cleanup(self):
         # We need exactly initial_cleanup + N*nursery_cleanup = nursery_size.
         # We choose the value of initial_cleanup to be between 1x and 2x the
         # value of nursery_cleanup.
@@ -450,6 +523,42 @@ class MiniMarkGC(MovingGCBase):
         self.initial_cleanup = self.nursery_size
         debug_stop("gc-set-nursery-size")
 
+    def grow_nursery(self, newsize):
+        # Replace the nursery, which must be empty, with a bigger one.
+        # Unlike allocate_nursery(), this leaves the major collection
+        # threshold alone.
+        ll_assert(self.nursery_free == self.nursery,
+                  "nursery not empty in grow_nursery()")
+        debug_start("gc-set-nursery-size")
+        debug_print("nursery size:", newsize)
+        llarena.arena_free(self.nursery)
+        self.nursery_size = newsize
+        self.nursery = self._alloc_nursery()
+        self.nursery_free = self.nursery
+        # the new nursery is fully zero-filled already
+        self.nursery_top = self.nursery + self.nursery_size
+        self.nursery_real_top = self.nursery_top
+        self.min_heap_size = max(self.min_heap_size, self.nursery_size *
+                                              self.major_collection_threshold)
+        self._set_initial_cleanup()
+        debug_stop("gc-set-nursery-size")
+
+    def update_wanted_nursery_size(self):
+        # Called after a major collection.  If the nursery is small
+        # compared to the heap, ask for it to be grown by the next call
+        # to collect_and_reserve().  The nursery is never shrunk.
+        if (self.heap_to_nursery_ratio <= 0.0 or
+                self.debug_tiny_nursery >= 0 or
+                self.debug_rotating_nurseries):
+            return
+        goal = (self.next_major_collection_threshold /
+                self.heap_to_nursery_ratio)
+        if goal > self.max_nursery_size:
+            goal = self.max_nursery_size
+        newsize = int(goal) & ~(WORD-1)
+        if newsize > self.nursery_size:
+            self.wanted_nursery_size = newsize
+
 
     def set_major_threshold_from(self, threshold, reserving_size=0):
         # Set the next_major_collection_threshold.
@@ -525,43 +634,38 @@ class MiniMarkGC(MovingGCBase):
         totalsize = size_gc_header + size
         rawtotalsize = raw_malloc_usage(totalsize)
         #
-        # If the object needs a finalizer, ask for a rawmalloc.
-        # The following check should be constant-folded.
+        # If the object needs an old-style finalizer, or if totalsize is
+        # greater than nonlarge_max (which should never be the case in
+        # practice), ask for a rawmalloc.  This is done out-of-line, so
+        # that the code inlined at every allocation site is only the
+        # nursery fast path below.  The first check should be
+        # constant-folded.
         if needs_finalizer and not is_finalizer_light:
-            # old-style finalizers only!
-            ll_assert(not contains_weakptr,
-                     "'needs_finalizer' and 'contains_weakptr' both specified")
-            obj = self.external_malloc(typeid, 0, alloc_young=False)
-            res = llmemory.cast_adr_to_ptr(obj, llmemory.GCREF)
-            self.register_finalizer(-1, res)
-            return res
-        #
-        # If totalsize is greater than nonlarge_max (which should never be
-        # the case in practice), ask for a rawmalloc.  The following check
-        # should be constant-folded.
+            return self._malloc_fixedsize_slowpath(typeid, needs_finalizer,
+                                                   is_finalizer_light,
+                                                   contains_weakptr)
         if rawtotalsize > self.nonlarge_max:
-            ll_assert(not contains_weakptr,
-                      "'contains_weakptr' specified for a large object")
-            obj = self.external_malloc(typeid, 0, alloc_young=True)
-            #
-        else:
-            # If totalsize is smaller than minimal_size_in_nursery, round it
-            # up.  The following check should also be constant-folded.
-            min_size = raw_malloc_usage(self.minimal_size_in_nursery)
-            if rawtotalsize < min_size:
-                totalsize = rawtotalsize = min_size
-            #
-            # Get the memory from the nursery.  If there is not enough space
-            # there, do a collect first.
-            result = self.nursery_free
-            self.nursery_free = result + totalsize
-            if self.nursery_free > self.nursery_top:
-                result = self.collect_and_reserve(result, totalsize)
-            #
-            # Build the object.
-            llarena.arena_reserve(result, totalsize)
-            obj = result + size_gc_header
-            self.init_gc_object(result, typeid, flags=0)
+            return self._malloc_fixedsize_slowpath(typeid, needs_finalizer,
+                                                   is_finalizer_light,
+                                                   contains_weakptr)
+        #
+        # If totalsize is smaller than minimal_size_in_nursery, round it
+        # up.  The following check should also be constant-folded.
+        min_size = self.min_nursery_alloc_size
+        if rawtotalsize < min_size:
+            totalsize = rawtotalsize = min_size
+        #
+        # Get the memory from the nursery.  If there is not enough space
+        # there, do a collect first.
+        result = self.nursery_free
+        self.nursery_free = result + totalsize
+        if unlikely(self.nursery_free > self.nursery_top):
+            result = self.collect_and_reserve(result, totalsize)
+        #
+        # Build the object.
+        llarena.arena_reserve(result, totalsize)
+        obj = result + size_gc_header
+        self.init_gc_object(result, typeid, flags=0)
         #
         # If it is a weakref or has a lightweight destructor, record it
         # (checks constant-folded).
@@ -571,6 +675,26 @@ class MiniMarkGC(MovingGCBase):
             self.young_objects_with_weakrefs.append(obj)
         return llmemory.cast_adr_to_ptr(obj, llmemory.GCREF)
 
+    def _malloc_fixedsize_slowpath(self, typeid, needs_finalizer,
+                                   is_finalizer_light, contains_weakptr):
+        # Called by malloc_fixedsize_clear() for objects that cannot
+        # simply be allocated in the nursery: objects with an old-style
+        # finalizer, or larger than nonlarge_max.
+        ll_assert(not contains_weakptr,
+                  "'contains_weakptr' specified for a finalizer or "
+                  "large object")
+        if needs_finalizer and not is_finalizer_light:
+            # old-style finalizers only!
+            obj = self.external_malloc(typeid, 0, alloc_young=False)
+            res = llmemory.cast_adr_to_ptr(obj, llmemory.GCREF)
+            self.register_finalizer(-1, res)
+            return res
+        obj = self.external_malloc(typeid, 0, alloc_young=True)
+        if needs_finalizer:
+            self.young_objects_with_destructors.append(obj)
+        return llmemory.cast_adr_to_ptr(obj, llmemory.GCREF)
+    _malloc_fixedsize_slowpath._dont_inline_ = True
+
 
     def malloc_varsize_clear(self, typeid, length, size, itemsize,
                              offset_to_length):
@@ -583,14 +707,15 @@ class MiniMarkGC(MovingGCBase):
         # are all constants (the arguments are constant due to
         # inlining).
         maxsize = self.nonlarge_max - raw_malloc_usage(nonvarsize)
+        rawitemsize = raw_malloc_usage(itemsize)
         if maxsize < 0:
             toobig = r_uint(0)    # the nonvarsize alone is too big
-        elif raw_malloc_usage(itemsize):
-            toobig = r_uint(maxsize // raw_malloc_usage(itemsize)) + 1
+        elif rawitemsize:
+            toobig = r_uint(maxsize // rawitemsize) + 1
         else:
             toobig = r_uint(sys.maxint) + 1
 
-        if r_uint(length) >= r_uint(toobig):
+        if unlikely(r_uint(length) >= r_uint(toobig)):
             #
             # If the total size of the object would be larger than
             # 'nonlarge_max', then allocate it externally.  We also
@@ -607,14 +732,14 @@ class MiniMarkGC(MovingGCBase):
             # the length word, so it should never be smaller than
             # 'minimal_size_in_nursery'
             ll_assert(raw_malloc_usage(totalsize) >=
-                      raw_malloc_usage(self.minimal_size_in_nursery),
+                      self.min_nursery_alloc_size,
                       "malloc_varsize_clear(): totalsize < minimalsize")
             #
             # Get the memory from the nursery.  If there is not enough space
             # there, do a collect first.
             result = self.nursery_free
             self.nursery_free = result + totalsize
-            if self.nursery_free > self.nursery_top:
+            if unlikely(self.nursery_free > self.nursery_top):
                 result = self.collect_and_reserve(result, totalsize)
             #
             # Build the object.
@@ -664,6 +789,12 @@ class MiniMarkGC(MovingGCBase):
             return prev_result
         self.minor_collection()
         #
+        # The nursery is empty now, so this is the place to grow it if
+        # the last major collection asked for it.
+        if self.wanted_nursery_size > 0:
+            self.grow_nursery(self.wanted_nursery_size)
+            self.wanted_nursery_size = 0
+        #
         if self.get_total_memory_used() > self.next_major_collection_threshold:
             self.major_collection()
             #
@@ -723,17 +854,18 @@ class MiniMarkGC(MovingGCBase):
             # negative length!  This likely comes from an overflow
             # earlier.  We will just raise MemoryError here.
             raise MemoryError
+        rawtotalsize = raw_malloc_usage(totalsize)
         #
         # If somebody calls this function a lot, we must eventually
         # force a full collection.
-        if (float(self.get_total_memory_used()) + raw_malloc_usage(totalsize) >
+        if (float(self.get_total_memory_used()) + rawtotalsize >
                 self.next_major_collection_threshold):
             self.minor_collection()
-            self.major_collection(raw_malloc_usage(totalsize))
+            self.major_collection(rawtotalsize)
         #
         # Check if the object would fit in the ArenaCollection.
         # Also, an object allocated from ArenaCollection must be old.
-        if (raw_malloc_usage(totalsize) <= self.small_request_threshold
+        if (rawtotalsize <= self.small_request_threshold
             and not alloc_young):
             #
             # Yes.  Round up 'totalsize' (it cannot overflow and it
@@ -744,6 +876,10 @@ class MiniMarkGC(MovingGCBase):
                       "rounding up made totalsize > small_request_threshold")
             #
             # Allocate from the ArenaCollection and clear the memory returned.
+            # We only get here for objects with an old-style finalizer, so
+            # this is not a hot path; and the clearing is needed anyway,
+            # because the ArenaCollection recycles the pages and blocks
+            # freed by major collections without clearing them.
             result = self.ac.malloc(totalsize)
             llmemory.raw_memclear(result, totalsize)
             #
@@ -752,9 +888,11 @@ class MiniMarkGC(MovingGCBase):
         else:
             # No, so proceed to allocate it externally with raw_malloc().
             # Check if we need to introduce the card marker bits area.
+            # (the size check comes before the typeid lookup because
+            # it is cheaper)
             if (self.card_page_indices <= 0  # <- this check is constant-folded
-                or not self.has_gcptr_in_varsize(typeid) or
-                raw_malloc_usage(totalsize) <= self.nonlarge_max):
+                or rawtotalsize <= self.nonlarge_max or
+                not self.has_gcptr_in_varsize(typeid)):
                 #
                 # In these cases, we don't want a card marker bits area.
                 # This case also includes all fixed-size objects.
@@ -774,8 +912,7 @@ class MiniMarkGC(MovingGCBase):
                     extra_flags |= GCFLAG_CARDS_SET
             #
             # Detect very rare cases of overflows
-            if raw_malloc_usage(totalsize) > (sys.maxint - (WORD-1)
-                                              - cardheadersize):
+            if rawtotalsize > (sys.maxint - (WORD-1) - cardheadersize):
                 raise MemoryError("rare case of overflow")
             #
             # Now we know that the following computations cannot overflow.
@@ -792,8 +929,10 @@ class MiniMarkGC(MovingGCBase):
             if not arena:
                 raise MemoryError("cannot allocate large object")
             #
-            # Reserve the card mark bits as a list of single bytes
-            # (the loop is empty in C).
+            # Reserve the card mark bits as a list of single bytes.  This
+            # is needed for the arena emulation, where get_card() reads
+            # each byte as a separate object.  In C, arena_reserve() is
+            # a no-op and the whole loop is removed by the C compiler.
             i = 0
             while i < cardheadersize:
                 llarena.arena_reserve(arena + i, llmemory.sizeof(lltype.Char))
@@ -903,7 +1042,20 @@ class MiniMarkGC(MovingGCBase):
     def is_in_nursery(self, addr):
         ll_assert(llmemory.cast_adr_to_int(addr) & 1 == 0,
                   "odd-valued (i.e. tagged) pointer unexpected here")
+        return self._in_nursery_range(addr)
+
+    def _in_nursery_range(self, addr):
+        # In C, 'nursery <= addr < nursery_real_top' is done as a single
+        # unsigned comparison, using nursery_real_top == nursery +
+        # nursery_size: an 'addr' below the nursery wraps around to a
+        # huge offset.  The emulated addresses cannot be subtracted if
+        # they are not in the same arena.
+        if we_are_translated_to_c():
+            offset = (r_uint(llmemory.cast_adr_to_int(addr)) -
+                      r_uint(llmemory.cast_adr_to_int(self.nursery)))
+            return offset < r_uint(self.nursery_size)
         return self.nursery <= addr < self.nursery_real_top
+    _in_nursery_range._always_inline_ = True
 
     def appears_to_be_young(self, addr):
         # "is a valid addr to a young object?"
@@ -923,7 +1075,7 @@ class MiniMarkGC(MovingGCBase):
             if not self.is_valid_gc_object(addr):
                 return False
 
-        if self.nursery <= addr < self.nursery_real_top:
+        if self._in_nursery_range(addr):
             return True      # addr is in the nursery
         #
         # Else, it may be in the set 'young_rawmalloced_objects'
@@ -972,6 +1124,7 @@ class MiniMarkGC(MovingGCBase):
         return intmask(
           ((r_uint(length) + r_uint((LONG_BIT << self.card_page_shift) - 1)) >>
            (self.card_page_shift + LONG_BIT_SHIFT)))
+    card_marking_words_for_length._always_inline_ = True
 
     def card_marking_bytes_for_length(self, length):
         # --- Unoptimized version:
@@ -981,6 +1134,7 @@ class MiniMarkGC(MovingGCBase):
         return intmask(
             ((r_uint(length) + r_uint((8 << self.card_page_shift) - 1)) >>
              (self.card_page_shift + 3)))
+    card_marking_bytes_for_length._always_inline_ = True
 
     def debug_check_consistency(self):
         if self.DEBUG:
@@ -1025,12 +1179,22 @@ class MiniMarkGC(MovingGCBase):
             #
             size_gc_header = self.gcheaderbuilder.size_gc_header
             p = llarena.getfakearenaaddress(obj - size_gc_header)
-            i = extra_words * WORD
-            while i > 0:
-                p -= 1
-                ll_assert(p.char[0] == '\x00',
-                          "the card marker bits are not cleared")
-                i -= 1
+            if we_are_translated_to_c():
+                # the card marker area is a whole number of words
+                i = extra_words
+                while i > 0:
+                    p -= WORD
+                    ll_assert(p.signed[0] == 0,
+                              "the card marker bits are not cleared")
+                    i -= 1
+            else:
+                # emulated arenas hold the card markers as separate bytes
+                i = extra_words * WORD
+                while i > 0:
+                    p -= 1
+                    ll_assert(p.char[0] == '\x00',
+                              "the card marker bits are not cleared")
+                    i -= 1
 
     # ----------
     # Write barrier
@@ -1062,12 +1226,16 @@ class MiniMarkGC(MovingGCBase):
     def JIT_minimal_size_in_nursery(cls):
         return cls.minimal_size_in_nursery
 
+    # The write barriers are inlined everywhere.  The flag is usually
+    # clear: it is removed by the first write after a minor collection.
     def write_barrier(self, addr_struct):
-        if self.header(addr_struct).tid & GCFLAG_TRACK_YOUNG_PTRS:
+        if unlikely(bool(self.header(addr_struct).tid &
+                         GCFLAG_TRACK_YOUNG_PTRS)):
             self.remember_young_pointer(addr_struct)
 
     def write_barrier_from_array(self, addr_array, index):
-        if self.header(addr_array).tid & GCFLAG_TRACK_YOUNG_PTRS:
+        if unlikely(bool(self.header(addr_array).tid &
+                         GCFLAG_TRACK_YOUNG_PTRS)):
             if self.card_page_indices > 0:     # <- constant-folded
                 self.remember_young_pointer_from_array2(addr_array, index)
             else:
@@ -1102,14 +1270,15 @@ class MiniMarkGC(MovingGCBase):
             # 'newvalue'-less version, too.
             self.old_objects_pointing_to_young.append(addr_struct)
             objhdr = self.header(addr_struct)
-            objhdr.tid &= ~GCFLAG_TRACK_YOUNG_PTRS
+            tid = objhdr.tid & ~GCFLAG_TRACK_YOUNG_PTRS
             #
             # Second part: if 'addr_struct' is actually a prebuilt GC
             # object and it's the first time we see a write to it, we
             # add it to the list 'prebuilt_root_objects'.
-            if objhdr.tid & GCFLAG_NO_HEAP_PTRS:
-                objhdr.tid &= ~GCFLAG_NO_HEAP_PTRS
+            if tid & GCFLAG_NO_HEAP_PTRS:
+                tid &= ~GCFLAG_NO_HEAP_PTRS
                 self.prebuilt_root_objects.append(addr_struct)
+            objhdr.tid = tid
 
         remember_young_pointer._dont_inline_ = True
         self.remember_young_pointer = remember_young_pointer
@@ -1127,7 +1296,8 @@ class MiniMarkGC(MovingGCBase):
             # We know that 'addr_array' has GCFLAG_TRACK_YOUNG_PTRS so far.
             #
             objhdr = self.header(addr_array)
-            if objhdr.tid & GCFLAG_HAS_CARDS == 0:
+            tid = objhdr.tid
+            if tid & GCFLAG_HAS_CARDS == 0:
                 #
                 if DEBUG:   # note: PYPY_GC_DEBUG=1 does not enable this
                     ll_assert(self.debug_is_old_object(addr_array),
@@ -1135,10 +1305,11 @@ class MiniMarkGC(MovingGCBase):
                 #
                 # no cards, use default logic.  Mostly copied from above.
                 self.old_objects_pointing_to_young.append(addr_array)
-                objhdr.tid &= ~GCFLAG_TRACK_YOUNG_PTRS
-                if objhdr.tid & GCFLAG_NO_HEAP_PTRS:
-                    objhdr.tid &= ~GCFLAG_NO_HEAP_PTRS
+                tid &= ~GCFLAG_TRACK_YOUNG_PTRS
+                if tid & GCFLAG_NO_HEAP_PTRS:
+                    tid &= ~GCFLAG_NO_HEAP_PTRS
                     self.prebuilt_root_objects.append(addr_array)
+                objhdr.tid = tid
                 return
             #
             # 'addr_array' is a raw_malloc'ed array with card markers
@@ -1159,9 +1330,9 @@ class MiniMarkGC(MovingGCBase):
             # does not take 3 arguments).
             addr_byte.char[0] = chr(byte | bitmask)
             #
-            if objhdr.tid & GCFLAG_CARDS_SET == 0:
+            if tid & GCFLAG_CARDS_SET == 0:
                 self.old_objects_with_cards_set.append(addr_array)
-                objhdr.tid |= GCFLAG_CARDS_SET
+                objhdr.tid = tid | GCFLAG_CARDS_SET
 
         remember_young_pointer_from_array2._dont_inline_ = True
         assert self.card_page_indices > 0
@@ -1197,24 +1368,25 @@ class MiniMarkGC(MovingGCBase):
         one of the following flags a bit too eagerly, which means we'll have
         a bit more objects to track, but being on the safe side.
         """
-        source_hdr = self.header(source_addr)
+        source_tid = self.header(source_addr).tid
         dest_hdr = self.header(dest_addr)
-        if dest_hdr.tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
+        dest_tid = dest_hdr.tid
+        if dest_tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
             return True
         # ^^^ a fast path of write-barrier
         #
-        if source_hdr.tid & GCFLAG_HAS_CARDS != 0:
+        if source_tid & GCFLAG_HAS_CARDS != 0:
             #
-            if source_hdr.tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
+            if source_tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
                 # The source object may have random young pointers.
                 # Return False to mean "do it manually in ll_arraycopy".
                 return False
             #
-            if source_hdr.tid & GCFLAG_CARDS_SET == 0:
+            if source_tid & GCFLAG_CARDS_SET == 0:
                 # The source object has no young pointers at all.  Done.
                 return True
             #
-            if dest_hdr.tid & GCFLAG_HAS_CARDS == 0:
+            if dest_tid & GCFLAG_HAS_CARDS == 0:
                 # The dest object doesn't have cards.  Do it manually.
                 return False
             #
@@ -1225,15 +1397,21 @@ class MiniMarkGC(MovingGCBase):
             self.manually_copy_card_bits(source_addr, dest_addr, length)
             return True
         #
-        if source_hdr.tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
+        # collect the flags to remove from 'dest', and store them once.
+        # (Don't compare the old and new tids to know if the store is
+        # needed: the tid of prebuilt objects is a symbolic in the llinterp.)
+        clear_flags = 0
+        if source_tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
             # there might be in source a pointer to a young object
             self.old_objects_pointing_to_young.append(dest_addr)
-            dest_hdr.tid &= ~GCFLAG_TRACK_YOUNG_PTRS
+            clear_flags = GCFLAG_TRACK_YOUNG_PTRS
         #
-        if dest_hdr.tid & GCFLAG_NO_HEAP_PTRS:
-            if source_hdr.tid & GCFLAG_NO_HEAP_PTRS == 0:
-                dest_hdr.tid &= ~GCFLAG_NO_HEAP_PTRS
+        if dest_tid & GCFLAG_NO_HEAP_PTRS:
+            if source_tid & GCFLAG_NO_HEAP_PTRS == 0:
+                clear_flags |= GCFLAG_NO_HEAP_PTRS
                 self.prebuilt_root_objects.append(dest_addr)
+        if clear_flags:
+            dest_hdr.tid = dest_tid & ~clear_flags
         return True
 
     def writebarrier_before_move(self, array_addr):
@@ -1334,6 +1512,8 @@ class MiniMarkGC(MovingGCBase):
         # Clear this mapping.
         if self.nursery_objects_shadows.length() > 0:
             self.nursery_objects_shadows.clear()
+        self.last_shadow_obj = NULL
+        self.last_shadow = NULL
         #
         # Walk the list of young raw-malloced objects, and either free
         # them or make them old.
@@ -1371,6 +1551,8 @@ class MiniMarkGC(MovingGCBase):
 
     def collect_cardrefs_to_nursery(self):
         size_gc_header = self.gcheaderbuilder.size_gc_header
+        card_page_indices = self.card_page_indices
+        byte_stride = 8 * card_page_indices    # indices covered by one byte
         oldlist = self.old_objects_with_cards_set
         while oldlist.non_empty():
             obj = oldlist.pop()
@@ -1394,66 +1576,98 @@ class MiniMarkGC(MovingGCBase):
             if self.header(obj).tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
                 #
                 # In that case, we just have to reset all card bits.
-                while bytes > 0:
-                    p -= 1
-                    p.char[0] = '\x00'
-                    bytes -= 1
+                # In C this is a single memset(); the emulated arenas
+                # hold the card markers as separate bytes.
+                if we_are_translated_to_c():
+                    llmemory.raw_memclear(p - bytes, bytes)
+                else:
+                    while bytes > 0:
+                        p -= 1
+                        p.char[0] = '\x00'
+                        bytes -= 1
                 #
             else:
                 # Walk the bytes encoding the card marker bits, and for
                 # each bit set, call trace_and_drag_out_of_nursery_partial().
-                interval_start = 0
+                # Only the set bits are visited: each iteration jumps
+                # directly to the lowest remaining one, and clears it.
+                # In C, the card bytes are first checked a whole word at
+                # a time (the card area starts on a word boundary): most
+                # of them are usually zero.
+                byte_start = 0
                 while bytes > 0:
-                    p -= 1
-                    cardbyte = ord(p.char[0])
-                    p.char[0] = '\x00'           # reset the bits
-                    bytes -= 1
-                    next_byte_start = interval_start + 8*self.card_page_indices
-                    #
-                    while cardbyte != 0:
-                        interval_stop = interval_start + self.card_page_indices
+                    stop = 0
+                    if we_are_translated_to_c() and bytes >= WORD:
+                        if (p - WORD).signed[0] == 0:
+                            p -= WORD
+                            bytes -= WORD
+                            byte_start += WORD * byte_stride
+                            continue
+                        stop = bytes - WORD
+                    while bytes > stop:
+                        p -= 1
+                        cardbyte = ord(p.char[0])
+                        p.char[0] = '\x00'           # reset the bits
+                        bytes -= 1
                         #
-                        if cardbyte & 1:
+                        while cardbyte != 0:
+                            bit = CARD_BYTE_LOWEST_BIT[cardbyte]
+                            cardbyte &= cardbyte - 1
+                            interval_start = (byte_start +
+                                              bit * card_page_indices)
+                            interval_stop = interval_start + card_page_indices
+                            #
                             if interval_stop > length:
                                 interval_stop = length
                                 #--- the sanity check below almost always
                                 #--- passes, except in situations like
                                 #--- test_writebarrier_before_copy_manually\
                                 #    _copy_card_bits
-                                #ll_assert(cardbyte <= 1 and bytes == 0,
+                                #ll_assert(cardbyte == 0 and bytes == 0,
                                 #          "premature end of object")
-                                ll_assert(bytes == 0, "premature end of object")
+                                ll_assert(bytes == 0,
+                                          "premature end of object")
                                 if interval_stop <= interval_start:
                                     break
                             self.trace_and_drag_out_of_nursery_partial(
                                 obj, interval_start, interval_stop)
                         #
-                        interval_start = interval_stop
-                        cardbyte >>= 1
-                    interval_start = next_byte_start
+                        byte_start += byte_stride
 
 
     def collect_oldrefs_to_nursery(self):
         # Follow the old_objects_pointing_to_young list and move the
-        # young objects they point to out of the nursery.
+        # young objects they point to out of the nursery.  The large
+        # objects are only traced when there is no small one left.
         oldlist = self.old_objects_pointing_to_young
-        while oldlist.non_empty():
-            obj = oldlist.pop()
-            #
-            # Check that the flags are correct: we must not have
-            # GCFLAG_TRACK_YOUNG_PTRS so far.
-            ll_assert(self.header(obj).tid & GCFLAG_TRACK_YOUNG_PTRS == 0,
-                      "old_objects_pointing_to_young contains obj with "
-                      "GCFLAG_TRACK_YOUNG_PTRS")
-            #
-            # Add the flag GCFLAG_TRACK_YOUNG_PTRS.  All live objects should
-            # have this flag set after a nursery collection.
-            self.header(obj).tid |= GCFLAG_TRACK_YOUNG_PTRS
-            #
-            # Trace the 'obj' to replace pointers to nursery with pointers
-            # outside the nursery, possibly forcing nursery objects out
-            # and adding them to 'old_objects_pointing_to_young' as well.
-            self.trace_and_drag_out_of_nursery(obj)
+        largelist = self.old_objects_pointing_to_young_large
+        while True:
+            while oldlist.non_empty():
+                self._collect_oldref_to_nursery(oldlist.pop())
+            if not largelist.non_empty():
+                break
+            self._collect_oldref_to_nursery(largelist.popleft())
+
+    def _collect_oldref_to_nursery(self, obj):
+        hdr = self.header(obj)
+        #
+        # Check that the flags are correct: we must not have
+        # GCFLAG_TRACK_YOUNG_PTRS so far.
+        ll_assert(hdr.tid & GCFLAG_TRACK_YOUNG_PTRS == 0,
+                  "old_objects_pointing_to_young contains obj with "
+                  "GCFLAG_TRACK_YOUNG_PTRS")
+        #
+        # Add the flag GCFLAG_TRACK_YOUNG_PTRS.  All live objects should
+        # have this flag set after a nursery collection.  We need to
+        # write the header anyway, so there is no point in recording
+        # the tid in the list together with 'obj'.
+        hdr.tid |= GCFLAG_TRACK_YOUNG_PTRS
+        #
+        # Trace the 'obj' to replace pointers to nursery with pointers
+        # outside the nursery, possibly forcing nursery objects out
+        # and adding them to 'old_objects_pointing_to_young' as well.
+        self.trace_and_drag_out_of_nursery(obj)
+    _collect_oldref_to_nursery._always_inline_ = True
 
     def trace_and_drag_out_of_nursery(self, obj):
         """obj must not be in the nursery.  This copies all the
@@ -1522,7 +1736,7 @@ class MiniMarkGC(MovingGCBase):
         #
         # Copy it.  Note that references to other objects in the
         # nursery are kept unchanged in this step.
-        llmemory.raw_memcopy(obj - size_gc_header, newhdr, totalsize)
+        self._copy_out_of_nursery(obj - size_gc_header, newhdr, totalsize)
         #
         # Set the old object's tid to -42 (containing all flags) and
         # replace the old object's content with the target address.
@@ -1546,9 +1760,26 @@ class MiniMarkGC(MovingGCBase):
         # objects when we walk 'old_objects_pointing_to_young'.
         if self.has_gcptr(typeid):
             # we only have to do it if we have any gcptrs
-            self.old_objects_pointing_to_young.append(newobj)
+            if raw_malloc_usage(totalsize) > self.large_copied_object_size:
+                self.old_objects_pointing_to_young_large.append(newobj)
+            else:
+                self.old_objects_pointing_to_young.append(newobj)
     _trace_drag_out._always_inline_ = True
 
+    def _copy_out_of_nursery(self, src, dst, totalsize):
+        # Most surviving objects are only a few words long: copy them
+        # word by word instead of calling memcpy() for each of them.
+        # 'totalsize' is aligned to WORD.  Only done in C: untranslated and
+        # in the llinterp, llarena cannot read a structure as raw words.
+        if we_are_translated_to_c() and totalsize <= 6 * WORD:
+            i = 0
+            while i < totalsize:
+                (dst + i).signed[0] = (src + i).signed[0]
+                i += WORD
+        else:
+            llmemory.raw_memcopy(src, dst, totalsize)
+    _copy_out_of_nursery._always_inline_ = True
+
     def _visit_young_rawmalloced_object(self, obj):
         # 'obj' points to a young, raw-malloced object.
         # Any young rawmalloced object never seen by the code here
@@ -1566,7 +1797,11 @@ class MiniMarkGC(MovingGCBase):
         added_somewhere = False
         #
         if hdr.tid & GCFLAG_TRACK_YOUNG_PTRS == 0:
-            self.old_objects_pointing_to_young.append(obj)
+            # no need to trace it if the type has no GC pointer at all,
+            # e.g. a large string; it will then also never see a write
+            # barrier, so it can stay without GCFLAG_TRACK_YOUNG_PTRS
+            if self.has_gcptr(self.get_type_id(obj)):
+                self.old_objects_pointing_to_young.append(obj)
             added_somewhere = True
         #
         if hdr.tid & GCFLAG_HAS_CARDS != 0:
@@ -1728,6 +1963,8 @@ class MiniMarkGC(MovingGCBase):
             self.max_heap_size_already_raised = True
             raise MemoryError
         #
+        self.update_wanted_nursery_size()
+        #
         # At the end, we can execute the finalizers of the objects
         # listed in 'run_finalizers'.  Note that this will typically do
         # more allocations.
@@ -1737,8 +1974,10 @@ class MiniMarkGC(MovingGCBase):
     def _free_if_unvisited(self, hdr):
         size_gc_header = self.gcheaderbuilder.size_gc_header
         obj = hdr + size_gc_header
-        if self.header(obj).tid & GCFLAG_VISITED:
-            self.header(obj).tid &= ~GCFLAG_VISITED
+        objhdr = self.header(obj)
+        tid = objhdr.tid
+        if tid & GCFLAG_VISITED:
+            objhdr.tid = tid & ~GCFLAG_VISITED
             return False     # survives
         return True      # dies
 
@@ -1746,8 +1985,10 @@ class MiniMarkGC(MovingGCBase):
         self.header(obj).tid &= ~GCFLAG_VISITED
 
     def free_rawmalloced_object_if_unvisited(self, obj):
-        if self.header(obj).tid & GCFLAG_VISITED:
-            self.header(obj).tid &= ~GCFLAG_VISITED   # survives
+        objhdr = self.header(obj)
+        tid = objhdr.tid
+        if tid & GCFLAG_VISITED:
+            objhdr.tid = tid & ~GCFLAG_VISITED   # survives
             self.old_rawmalloced_objects.append(obj)
         else:
             size_gc_header = self.gcheaderbuilder.size_gc_header
@@ -1757,7 +1998,7 @@ class MiniMarkGC(MovingGCBase):
             #
             # Must also include the card marker area, if any
             if (self.card_page_indices > 0    # <- this is constant-folded
-                and self.header(obj).tid & GCFLAG_HAS_CARDS):
+                and tid & GCFLAG_HAS_CARDS):
                 #
                 # Get the length and compute the number of extra bytes
                 typeid = self.get_type_id(obj)
@@ -1816,10 +2057,19 @@ class MiniMarkGC(MovingGCBase):
     def _collect_ref_stk(self, root):
         obj = root.address[0]
         llop.debug_nonnull_pointer(lltype.Void, obj)
-        self.objects_to_trace.append(obj)
+        # Skip the prebuilt objects that still have GCFLAG_NO_HEAP_PTRS,
+        # which visit() ignores anyway.  The static roots often point to
+        # such objects.  (The objects in 'prebuilt_root_objects' are
+        # exactly those that lost this flag, so they can't be skipped.)
+        if self.header(obj).tid & GCFLAG_NO_HEAP_PTRS == 0:
+            self.objects_to_trace.append(obj)
 
     def _collect_ref_rec(self, root, ignored):
-        self.objects_to_trace.append(root.address[0])
+        # Don't push the objects that visit() would ignore anyway.  Most
+        # references found during marking go to already-visited objects.
+        obj = root.address[0]
+        if self.header(obj).tid & (GCFLAG_VISITED | GCFLAG_NO_HEAP_PTRS) == 0:
+            self.objects_to_trace.append(obj)
 
     def visit_all_objects(self):
         pending = self.objects_to_trace
@@ -1839,12 +2089,13 @@ class MiniMarkGC(MovingGCBase):
         # and the GCFLAG_VISITED will be reset at the end of the
         # collection.
         hdr = self.header(obj)
-        if hdr.tid & (GCFLAG_VISITED | GCFLAG_NO_HEAP_PTRS):
+        tid = hdr.tid
+        if tid & (GCFLAG_VISITED | GCFLAG_NO_HEAP_PTRS):
             return
         #
         # It's the first time.  We set the flag.
-        hdr.tid |= GCFLAG_VISITED
-        if not self.has_gcptr(llop.extract_ushort(llgroup.HALFWORD, hdr.tid)):
+        hdr.tid = tid | GCFLAG_VISITED
+        if not self.has_gcptr(llop.extract_ushort(llgroup.HALFWORD, tid)):
             return
         #
         # Trace the content of the object and put all objects it references
@@ -1885,12 +2136,16 @@ class MiniMarkGC(MovingGCBase):
         # nursery.  Find or allocate a "shadow" object, which is
         # where the object will be moved by the next minor
         # collection
+        if obj == self.last_shadow_obj:
+            return self.last_shadow
         if self.header(obj).tid & GCFLAG_HAS_SHADOW:
             shadow = self.nursery_objects_shadows.get(obj)
             ll_assert(shadow != NULL,
                       "GCFLAG_HAS_SHADOW but no shadow found")
         else:
             shadow = self._allocate_shadow(obj)
+        self.last_shadow_obj = obj
+        self.last_shadow = shadow
         #
         # The answer is the address of the shadow.
         return shadow
@@ -2017,17 +2272,12 @@ class MiniMarkGC(MovingGCBase):
     _append_if_nonnull = staticmethod(_append_if_nonnull)
 
     def _finalization_state(self, obj):
+        # 0: no flag; 1: ORDERING only; 2: VISITED and ORDERING;
+        # 3: VISITED only.  Computed without branches.
         tid = self.header(obj).tid
-        if tid & GCFLAG_VISITED:
-            if tid & GCFLAG_FINALIZATION_ORDERING:
-                return 2
-            else:
-                return 3
-        else:
-            if tid & GCFLAG_FINALIZATION_ORDERING:
-                return 1
-            else:
-                return 0
+        visited = (tid >> _VISITED_BIT) & 1
+        ordering = (tid >> _FINALIZATION_ORDERING_BIT) & 1
+        return (visited << 1) | (visited ^ ordering)
 
     def _bump_finalization_state_from_0_to_1(self, obj):
         ll_assert(self._finalization_state(obj) == 0,
@@ -2047,8 +2297,9 @@ class MiniMarkGC(MovingGCBase):
         while pending.non_empty():
             y = pending.pop()
             hdr = self.header(y)
-            if hdr.tid & GCFLAG_FINALIZATION_ORDERING:     # state 2 ?
-                hdr.tid &= ~GCFLAG_FINALIZATION_ORDERING   # change to state 3
+            tid = hdr.tid
+            if tid & GCFLAG_FINALIZATION_ORDERING:         # state 2 ?
+                hdr.tid = tid & ~GCFLAG_FINALIZATION_ORDERING  # to state 3
                 self.trace(y, self._append_if_nonnull, pending)
 
     def _recursively_bump_finalization_state_from_1_to_2(self, obj):
@@ -2113,19 +2364,17 @@ class MiniMarkGC(MovingGCBase):
         """Called during a major collection."""
         # walk over list of objects that contain weakrefs
         # if the object it references does not survive, invalidate the weakref
-        new_with_weakref = self.AddressStack()
-        while self.old_objects_with_weakrefs.non_empty():
-            obj = self.old_objects_with_weakrefs.pop()
-            if self.header(obj).tid & GCFLAG_VISITED == 0:
-                continue # weakref itself dies
-            offset = self.weakpointer_offset(self.get_type_id(obj))
-            pointing_to = (obj + offset).address[0]
-            ll_assert((self.header(pointing_to).tid & GCFLAG_NO_HEAP_PTRS)
-                      == 0, "registered old weakref should not "
-                            "point to a NO_HEAP_PTRS obj")
-            if self.header(pointing_to).tid & GCFLAG_VISITED:
-                new_with_weakref.append(obj)
-            else:
-                (obj + offset).address[0] = llmemory.NULL
-        self.old_objects_with_weakrefs.delete()
-        self.old_objects_with_weakrefs = new_with_weakref
+        self.old_objects_with_weakrefs.filter(self._keep_old_weakref, None)
+
+    def _keep_old_weakref(self, obj, ignored):
+        if self.header(obj).tid & GCFLAG_VISITED == 0:
+            return False # weakref itself dies
+        offset = self.weakpointer_offset(self.get_type_id(obj))
+        pointing_to = (obj + offset).address[0]
+        ll_assert((self.header(pointing_to).tid & GCFLAG_NO_HEAP_PTRS)
+                  == 0, "registered old weakref should not "
+                        "point to a NO_HEAP_PTRS obj")
+        if self.header(pointing_to).tid & GCFLAG_VISITED:
+            return True
+        (obj + offset).address[0] = llmemory.NULL
+        return False
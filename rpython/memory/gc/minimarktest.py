@@ -1,4 +1,3 @@
-import sys
 from rpython.rtyper.lltypesystem import llarena
 from rpython.rtyper.lltypesystem.llmemory import raw_malloc_usage
 from rpython.rlib.debug import ll_assert
@@ -7,7 +6,7 @@ from rpython.rlib.rarithmetic import LONG_BIT
 # For testing, a simple implementation of ArenaCollection.
 # This version could be used together with malloc, but
 # it requires an extra word per object in the 'all_objects'
-# list.
+# list, and the object's size in the parallel 'all_sizes' list.
 
 WORD = LONG_BIT // 8
 
@@ -19,6 +18,7 @@ class SimpleArenaCollection(object):
         self.page_size = page_size
         self.small_request_threshold = small_request_threshold
         self.all_objects = []
+        self.all_sizes = []
         self.total_memory_used = 0
         self.arenas_count = 0
 
@@ -30,23 +30,29 @@ class SimpleArenaCollection(object):
         #
         result = llarena.arena_malloc(nsize, False)
         llarena.arena_reserve(result, size)
-        self.all_objects.append((result, nsize))
+        self.all_objects.append(result)
+        self.all_sizes.append(nsize)
         self.total_memory_used += nsize
         return result
 
     def mass_free_prepare(self):
         self.old_all_objects = self.all_objects
+        self.old_all_sizes = self.all_sizes
         self.all_objects = []
+        self.all_sizes = []
         self.total_memory_used = 0
 
     def mass_free_incremental(self, ok_to_free_func, max_pages):
         old = self.old_all_objects
+        old_sizes = self.old_all_sizes
         while old:
-            rawobj, nsize = old.pop()
+            rawobj = old.pop()
+            nsize = old_sizes.pop()
             if ok_to_free_func(rawobj):
                 llarena.arena_free(rawobj)
             else:
-                self.all_objects.append((rawobj, nsize))
+                self.all_objects.append(rawobj)
+                self.all_sizes.append(nsize)
                 self.total_memory_used += nsize
             max_pages -= 0.1
             if max_pages <= 0:
@@ -54,6 +60,18 @@ class SimpleArenaCollection(object):
         return True
 
     def mass_free(self, ok_to_free_func):
+        # one pass without the 'max_pages' accounting, and with the
+        # functions looked up only once
         self.mass_free_prepare()
-        res = self.mass_free_incremental(ok_to_free_func, sys.maxint)
-        assert res
+        arena_free = llarena.arena_free
+        append = self.all_objects.append
+        append_size = self.all_sizes.append
+        for rawobj, nsize in zip(self.old_all_objects, self.old_all_sizes):
+            if ok_to_free_func(rawobj):
+                arena_free(rawobj)
+            else:
+                append(rawobj)
+                append_size(nsize)
+        self.old_all_objects = []
+        self.old_all_sizes = []
+        self.total_memory_used = sum(self.all_sizes)
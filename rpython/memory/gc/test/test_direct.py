@@ -605,6 +605,69 @@ class TestMiniMarkGCSimple(DirectGCTest):
 class TestMiniMarkGCFull(DirectGCTest):
     from rpython.memory.gc.minimark import MiniMarkGC as GCClass
 
+    def test_grow_nursery(self):
+        self.gc.DEBUG = False      # no rotating nurseries
+        old_size = self.gc.nursery_size
+        p = self.malloc(S)
+        p.x = 42
+        self.stackroots.append(p)
+        self.gc.collect()
+        self.gc.next_major_collection_threshold = 64.0 * old_size
+        self.gc.update_wanted_nursery_size()
+        assert self.gc.wanted_nursery_size == 2 * old_size
+        # the nursery is only grown from collect_and_reserve()
+        while self.gc.nursery_size == old_size:
+            self.malloc(S)
+        assert self.gc.nursery_size == 2 * old_size
+        assert self.gc.wanted_nursery_size == 0
+        assert self.stackroots[0].x == 42
+        assert self.gc.nursery_free - self.gc.nursery < 8 * WORD
+    test_grow_nursery.GC_PARAMS = {'heap_to_nursery_ratio': 32.0,
+                                   'max_nursery_size': 1024*WORD}
+
+    def test_large_young_object_without_gcptrs(self):
+        CHARS = lltype.GcArray(lltype.Char)
+        a = self.malloc(CHARS, self.gc.nonlarge_max + 1)
+        a[5] = 'x'
+        self.stackroots.append(a)
+        self.gc.minor_collection()
+        assert not self.gc.old_objects_pointing_to_young.non_empty()
+        a = self.stackroots[0]
+        assert a[5] == 'x'
+        hdr = self.gc.header(llmemory.cast_ptr_to_adr(a))
+        assert hdr.tid & minimark.GCFLAG_TRACK_YOUNG_PTRS == 0
+        self.gc.collect()
+        assert self.stackroots[0][5] == 'x'
+
+    def test_setup_read_from_env(self, monkeypatch):
+        monkeypatch.setenv('PYPY_GC_NURSERY', str(64*WORD))
+        self.setup_method(self.test_setup_read_from_env)
+        assert self.gc.nursery_size == 64*WORD
+        assert self.gc.nursery_free == self.gc.nursery
+        self.test_simple()
+    test_setup_read_from_env.GC_PARAMS = {'read_from_env': True}
+
+    def test_id_shadow_cache(self):
+        p = self.malloc(S)
+        self.stackroots.append(p)
+        i1 = self.gc.id(p)
+        assert self.gc.last_shadow_obj == llmemory.cast_ptr_to_adr(p)
+        assert self.gc.id(p) == i1
+        self.gc.minor_collection()
+        assert self.gc.last_shadow_obj == llmemory.NULL
+        assert self.gc.id(self.stackroots[0]) == i1
+
+    def test_finalization_state(self):
+        VISITED = minimark.GCFLAG_VISITED
+        ORDERING = minimark.GCFLAG_FINALIZATION_ORDERING
+        obj = llmemory.cast_ptr_to_adr(self.malloc(S))
+        hdr = self.gc.header(obj)
+        for flags, state in [(0, 0), (ORDERING, 1),
+                             (VISITED | ORDERING, 2), (VISITED, 3)]:
+            hdr.tid = (hdr.tid & ~(VISITED | ORDERING)) | flags
+            assert self.gc._finalization_state(obj) == state
+        hdr.tid &= ~(VISITED | ORDERING)
+
 class TestIncrementalMiniMarkGCSimple(TestMiniMarkGCSimple):
     from rpython.memory.gc.incminimark import IncrementalMiniMarkGC as GCClass
 
@@ -68,3 +68,11 @@ def test_set_major_threshold():
     b = gc.set_major_threshold_from(42.7)
     assert b is False
     assert gc.next_major_collection_threshold == 100.0
+
+def test_card_byte_lowest_bit():
+    from rpython.memory.gc.minimark import CARD_BYTE_LOWEST_BIT
+    assert len(CARD_BYTE_LOWEST_BIT) == 256
+    for n in range(1, 256):
+        i = CARD_BYTE_LOWEST_BIT[n]
+        assert n & (1 << i)
+        assert n & ((1 << i) - 1) == 0
@@ -377,8 +377,21 @@ class BaseFrameworkGCTransformer(GCTransformer):
                  annmodel.SomeInteger(nonneg=True),
                  s_False, s_False, s_False], s_gcref,
                 inline = True)
+            # another copy for objects with a light finalizer, i.e. a
+            # destructor: not inlined, but with the flags constant-folded
+            malloc_light_finalizer = func_with_new_name(
+                malloc_fast_meth,
+                "malloc_light_finalizer")
+            s_True = annmodel.SomeBool()
+            s_True.const = True
+            self.malloc_light_finalizer_ptr = getfn(
+                malloc_light_finalizer,
+                [s_gc, s_typeid16,
+                 annmodel.SomeInteger(nonneg=True),
+                 s_True, s_True, s_False], s_gcref)
         else:
             self.malloc_fast_ptr = None
+            self.malloc_light_finalizer_ptr = None
 
         # in some GCs we can also inline the common case of
         # malloc_varsize(typeid, length, (3 constant sizes), True, False)
@@ -827,6 +840,10 @@ class BaseFrameworkGCTransformer(GCTransformer):
                 not c_has_finalizer.value and
                 (self.malloc_fast_is_clearing or not zero)):
                 malloc_ptr = self.malloc_fast_ptr
+            elif (self.malloc_light_finalizer_ptr is not None and
+                  c_has_light_finalizer.value and
+                  (self.malloc_fast_is_clearing or not zero)):
+                malloc_ptr = self.malloc_light_finalizer_ptr
             else:
                 malloc_ptr = self.malloc_fixedsize_ptr
             args = [self.c_const_gc, c_type_id, c_size,
@@ -171,6 +171,33 @@ def get_address_stack(chunk_size=DEFAULT_CHUNK_SIZE, cache={}):
                 count = chunk_size
         foreach._annspecialcase_ = 'specialize:arg(1)'
 
+        def filter(self, callback, arg):
+            """Remove from the stack, in place, all addresses for which
+            'callback(address, arg)' returns False.  The order of the
+            remaining addresses is not preserved.
+            """
+            chunk = self.chunk
+            count = self.used_in_last_chunk
+            while chunk:
+                while count > 0:
+                    count -= 1
+                    if callback(chunk.items[count], arg):
+                        continue
+                    if (chunk == self.chunk and
+                            count == self.used_in_last_chunk - 1):
+                        # it is the top item: just pop it.  This might
+                        # free 'chunk', so continue from the new top.
+                        self.pop()
+                        chunk = self.chunk
+                        count = self.used_in_last_chunk
+                    else:
+                        # overwrite it with the top item, which was
+                        # already kept by an earlier call to 'callback'
+                        chunk.items[count] = self.pop()
+                chunk = chunk.next
+                count = chunk_size
+        filter._annspecialcase_ = 'specialize:arg(1)'
+
         def stack2dict(self):
             result = AddressDict(self.length())
             self.foreach(_add_in_dict, result)
@@ -80,6 +80,30 @@ class TestAddressStack(object):
         ll.foreach(callback, 42)
         assert seen == addrs or seen[::-1] == addrs   # order not guaranteed
 
+    def test_filter(self):
+        AddressStack = get_address_stack(chunk_size=10)
+        addrs = [raw_malloc(llmemory.sizeof(lltype.Signed))
+                 for i in range(95)]
+        for keep in [lambda i: i % 3 == 0, lambda i: i < 42,
+                     lambda i: i >= 42, lambda i: False, lambda i: True]:
+            ll = AddressStack()
+            for i in range(95):
+                ll.append(addrs[i])
+            kept = dict.fromkeys([addrs[i] for i in range(95) if keep(i)])
+            def callback(addr, fortytwo):
+                assert fortytwo == 42
+                return addr in kept
+            ll.filter(callback, 42)
+            assert ll.length() == len(kept)
+            seen = []
+            while ll.non_empty():
+                seen.append(ll.pop())
+            assert len(seen) == len(kept)
+            assert dict.fromkeys(seen) == kept
+            ll.delete()
+        for addr in addrs:
+            raw_free(addr)
+
     def test_remove(self):
         AddressStack = get_address_stack()
         addrs = [raw_malloc(llmemory.sizeof(lltype.Signed))
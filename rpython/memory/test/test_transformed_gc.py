@@ -1391,6 +1391,42 @@ class TestMiniMarkGC(TestHybridGC):
         res = self.runner('instantiate_nonmovable')
         assert res([]) == 0
 
+    def define_malloc_light_finalizer(cls):
+        class B(object):
+            pass
+        b = B()
+        b.num_deleted = 0
+        class A(object):
+            def __del__(self):
+                b.num_deleted += 1
+        def f():
+            i = 0
+            while i < 10:
+                a = A()
+                i += 1
+            a = None
+            rgc.collect()
+            rgc.collect()
+            return b.num_deleted
+        return f
+
+    def test_malloc_light_finalizer(self):
+        run, transformer = self.runner('malloc_light_finalizer',
+                                       transformer=True)
+        # the A() instances are allocated with the specialized helper
+        fnptr = transformer.malloc_light_finalizer_ptr
+        assert fnptr is not None
+        seen = 0
+        for graph in self.db.translator.graphs:
+            for block in graph.iterblocks():
+                for op in block.operations:
+                    if (op.opname == 'direct_call' and
+                            op.args[0].value._obj is fnptr.value._obj):
+                        seen += 1
+        assert seen > 0
+        res = run([])
+        assert res == 10
+
 
 class GcHooksStats(object):
     minors = 0
@@ -264,6 +264,11 @@ def _ll_list_resize_really(l, newsize, overallocate):
     l.length to newsize.  Note that l.items may change, and even if
     newsize is less than l.length on entry.
     """
+    if not overallocate and newsize > 0 and len(l.items) == newsize:
+        # the current items array already has exactly the requested
+        # size (it cannot be shorter than l.length): resize in-place
+        l.length = newsize
+        return
     _ll_list_resize_hint_really(l, newsize, overallocate)
     l.length = newsize
 
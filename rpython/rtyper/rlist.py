@@ -1,5 +1,4 @@
 from rpython.annotator import model as annmodel
-from rpython.flowspace.model import Constant
 from rpython.rlib import rgc, jit, types
 from rpython.rtyper.debug import ll_assert
 from rpython.rlib.objectmodel import malloc_zero_filled, enforceargs, specialize
@@ -10,6 +9,7 @@ from rpython.rtyper.annlowlevel import ADTInterface
 from rpython.rtyper.error import TyperError
 from rpython.rtyper.lltypesystem.lltype import typeOf, Ptr, Void, Signed, Bool
 from rpython.rtyper.lltypesystem.lltype import nullptr, Char, UniChar, Number
+from rpython.rtyper.lltypesystem.lltype import Primitive
 from rpython.rtyper.rmodel import Repr, IteratorRepr
 from rpython.rtyper.rint import IntegerRepr
 from rpython.rtyper.rstr import AbstractStringRepr, AbstractCharRepr
@@ -73,20 +73,23 @@ class AbstractBaseListRepr(Repr):
             return self.null_const()
         if not isinstance(listobj, list):
             raise TyperError("expected a list: %r" % (listobj,))
-        try:
-            key = Constant(listobj)
-            return self.list_cache[key]
-        except KeyError:
-            self.setup()
-            n = len(listobj)
-            result = self.prepare_const(n)
-            self.list_cache[key] = result
-            r_item = self.item_repr
-            if r_item.lowleveltype is not Void:
-                for i in range(n):
-                    x = listobj[i]
-                    result.ll_setitem_fast(i, r_item.convert_const(x))
-            return result
+        # prebuilt lists are mutable, so they are cached by identity; the
+        # entry keeps 'listobj' alive, which keeps its id() from being reused
+        key = id(listobj)
+        entry = self.list_cache.get(key)
+        if entry is not None:
+            assert entry[0] is listobj
+            return entry[1]
+        self.setup()
+        n = len(listobj)
+        result = self.prepare_const(n)
+        self.list_cache[key] = listobj, result
+        r_item = self.item_repr
+        if r_item.lowleveltype is not Void:
+            for i in range(n):
+                x = listobj[i]
+                result.ll_setitem_fast(i, r_item.convert_const(x))
+        return result
 
     def null_const(self):
         raise NotImplementedError
@@ -142,7 +145,12 @@ class AbstractBaseListRepr(Repr):
     def rtype_method_reverse(self, hop):
         v_lst, = hop.inputargs(self)
         hop.exception_cannot_occur()
-        hop.gendirectcall(ll_reverse,v_lst)
+        ITEM = self.item_repr.lowleveltype
+        if isinstance(ITEM, Primitive) and ITEM is not Void:
+            llfn = ll_reverse_primitive
+        else:
+            llfn = ll_reverse
+        hop.gendirectcall(llfn, v_lst)
 
     def rtype_method_remove(self, hop):
         v_lst, v_value = hop.inputargs(self, self.item_repr)
@@ -349,7 +357,12 @@ def rtype_alloc_and_set(hop):
     r_list = hop.r_result
     v_count, v_item = hop.inputargs(Signed, r_list.item_repr)
     cLIST = hop.inputconst(Void, r_list.LIST)
-    return hop.gendirectcall(ll_alloc_and_set, cLIST, v_count, v_item)
+    ITEM = r_list.item_repr.lowleveltype
+    if isinstance(ITEM, Primitive) and ITEM is not Void:
+        llfn = ll_alloc_and_set_primitive
+    else:
+        llfn = ll_alloc_and_set
+    return hop.gendirectcall(llfn, cLIST, v_count, v_item)
 
 
 class __extend__(pairtype(AbstractBaseListRepr, AbstractBaseListRepr)):
@@ -497,9 +510,10 @@ def _ll_alloc_and_set_nojit(LIST, count, item):
     l = LIST.ll_newlist(count)
     if malloc_zero_filled and _ll_zero_or_null(item):
         return l
+    items = l.ll_items()
     i = 0
     while i < count:
-        l.ll_setitem_fast(i, item)
+        items[i] = item
         i += 1
     return l
 
@@ -515,6 +529,30 @@ def _ll_alloc_and_set_jit(LIST, count, item):
         # a not-too-large constant.
         return _ll_alloc_and_set_nonnull(LIST, count, item)
 
+def ll_alloc_and_set_primitive(LIST, count, item):
+    count = int_force_ge_zero(count)
+    if jit.we_are_jitted():
+        return _ll_alloc_and_set_jit(LIST, count, item)
+    else:
+        return _ll_alloc_and_set_primitive_nojit(LIST, count, item)
+
+def _ll_alloc_and_set_primitive_nojit(LIST, count, item):
+    l = LIST.ll_newlist(count)
+    if malloc_zero_filled and _ll_zero_or_null(item):
+        return l
+    if count > 0:
+        # no write barrier is involved: store the first item, then fill
+        # the rest by doubling bulk copies (i.e. memcpy()) of what is
+        # already filled in
+        items = l.ll_items()
+        items[0] = item
+        filled = 1
+        while filled < count:
+            step = min(filled, count - filled)
+            rgc.ll_arraycopy(items, items, 0, filled, step)
+            filled += step
+    return l
+
 @jit.oopspec("newlist_clear(count)")
 def _ll_alloc_and_clear(LIST, count):
     l = LIST.ll_newlist(count)
@@ -575,7 +613,9 @@ def ll_len(l):
     return l.ll_length()
 
 def ll_list_is_true(l):
-    # check if a list is True, allowing for None
+    # check if a list is True, allowing for None.  The annotator never
+    # proves that a SomeList is not None, and prebuilt constant lists are
+    # already folded before rtyping, so there is no non-null variant.
     return bool(l) and l.ll_length() != 0
 # no oopspec -- the function is inlined by the JIT
 
@@ -687,6 +727,21 @@ def ll_reverse(l):
         i += 1
         length_1_i -= 1
 
+@jit.look_inside_iff(lambda l: jit.isvirtual(l))
+def ll_reverse_primitive(l):
+    # Lists of primitives need no write barrier, so we can swap directly
+    # in the items array instead of going through ll_getitem_fast() and
+    # ll_setitem_fast(), which reload 'l.items' at every access.
+    items = l.ll_items()
+    i = 0
+    j = l.ll_length() - 1
+    while i < j:
+        tmp = items[i]
+        items[i] = items[j]
+        items[j] = tmp
+        i += 1
+        j -= 1
+
 def ll_getitem_nonneg(func, basegetitem, l, index):
     ll_assert(index >= 0, "unexpectedly negative list getitem index")
     if func is dum_checkidx:
@@ -789,7 +844,12 @@ def ll_extend(l1, l2):
     except OverflowError:
         raise MemoryError
     l1._ll_resize_ge(newlength)
+    # both lengths are read only once, before the resize; the copy itself
+    # is a single bulk ll_arraycopy() which fetches the (possibly new)
+    # items arrays only after the resize
     ll_arraycopy(l2, l1, 0, len1, len2)
+# no oopspec -- the function is inlined by the JIT, which is what lets it
+# see through extend() on virtual lists
 
 def ll_extend_with_str(lst, s, getstrlen, getstritem):
     return ll_extend_with_str_slice_startonly(lst, s, getstrlen, getstritem, 0)
@@ -805,13 +865,14 @@ def ll_extend_with_str_slice_startonly(lst, s, getstrlen, getstritem, start):
     except OverflowError:
         raise MemoryError
     lst._ll_resize_ge(newlength)
+    items = lst.ll_items()
     i = start
     j = len1
     while i < len2:
         c = getstritem(s, i)
         if listItemType(lst) is UniChar:
             c = unichr(ord(c))
-        lst.ll_setitem_fast(j, c)
+        items[j] = c
         i += 1
         j += 1
 # not inlined by the JIT -- contains a loop
@@ -831,13 +892,14 @@ def ll_extend_with_str_slice_startstop(lst, s, getstrlen, getstritem,
     except OverflowError:
         raise MemoryError
     lst._ll_resize_ge(newlength)
+    items = lst.ll_items()
     i = start
     j = len1
     while i < stop:
         c = getstritem(s, i)
         if listItemType(lst) is UniChar:
             c = unichr(ord(c))
-        lst.ll_setitem_fast(j, c)
+        items[j] = c
         i += 1
         j += 1
 # not inlined by the JIT -- contains a loop
@@ -851,13 +913,14 @@ def ll_extend_with_str_slice_minusone(lst, s, getstrlen, getstritem):
     except OverflowError:
         raise MemoryError
     lst._ll_resize_ge(newlength)
+    items = lst.ll_items()
     i = 0
     j = len1
     while i < len2m1:
         c = getstritem(s, i)
         if listItemType(lst) is UniChar:
             c = unichr(ord(c))
-        lst.ll_setitem_fast(j, c)
+        items[j] = c
         i += 1
         j += 1
 # not inlined by the JIT -- contains a loop
@@ -871,11 +934,12 @@ def ll_extend_with_char_count(lst, char, count):
     except OverflowError:
         raise MemoryError
     lst._ll_resize_ge(newlength)
+    items = lst.ll_items()
     j = len1
     if listItemType(lst) is UniChar:
         char = unichr(ord(char))
     while j < newlength:
-        lst.ll_setitem_fast(j, char)
+        items[j] = char
         j += 1
 
 
@@ -919,9 +983,10 @@ def ll_listdelslice_startonly(l, start):
     newlength = start
     null = ll_null_item(l)
     if null is not None:
+        items = l.ll_items()
         j = l.ll_length() - 1
         while j >= newlength:
-            l.ll_setitem_fast(j, null)
+            items[j] = null
             j -= 1
     l._ll_resize_le(newlength)
 
@@ -936,9 +1001,10 @@ def ll_listdelslice_startstop(l, start, stop):
     newlength = length - (stop-start)
     null = ll_null_item(l)
     if null is not None:
+        items = l.ll_items()
         j = length - 1
         while j >= newlength:
-            l.ll_setitem_fast(j, null)
+            items[j] = null
             j -= 1
     l._ll_resize_le(newlength)
 ll_listdelslice_startstop.oopspec = 'list.delslice_startstop(l, start, stop)'
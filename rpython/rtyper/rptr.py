@@ -31,6 +31,12 @@ class PtrRepr(Repr):
         self.lowleveltype = ptrtype
         if rtyper is not None:
             self.rtyper = rtyper    # only for _convert_const_ptr()
+        # for rtype_simple_call(), which is used at every call site
+        if isinstance(ptrtype.TO, lltype.FuncType):
+            self.nexpected = len(ptrtype.TO.ARGS)
+            self.call_resulttype = ptrtype.TO.RESULT
+        else:
+            self.nexpected = -1     # not a function
 
     def ll_str(self, p):
         from rpython.rtyper.lltypesystem.rstr import ll_str
@@ -88,10 +94,10 @@ class PtrRepr(Repr):
         return hop.genop('ptr_nonzero', vlist, resulttype=lltype.Bool)
 
     def rtype_simple_call(self, hop):
-        if not isinstance(self.lowleveltype.TO, lltype.FuncType):
+        nexpected = self.nexpected
+        if nexpected < 0:
             raise TyperError("calling a non-function %r", self.lowleveltype.TO)
         vlist = hop.inputargs(*hop.args_r)
-        nexpected = len(self.lowleveltype.TO.ARGS)
         nactual = len(vlist)-1
         if nactual != nexpected:
             raise TyperError("argcount mismatch:  expected %d got %d" %
@@ -105,7 +111,7 @@ class PtrRepr(Repr):
             vlist.append(hop.inputconst(lltype.Void, None))
         hop.exception_is_here()
         return hop.genop(opname, vlist,
-                         resulttype = self.lowleveltype.TO.RESULT)
+                         resulttype = self.call_resulttype)
 
     def rtype_call_args(self, hop):
         raise TyperError("kwds args not supported")
@@ -235,37 +241,32 @@ class InteriorPtrRepr(Repr):
         assert numitemoffsets <= 1
         if numitemoffsets > 0:
             self.lowleveltype = lltype.Ptr(self.parentptrtype._interior_ptr_type_with_index(self.resulttype.TO))
+            # the fields of the lowleveltype: the parent pointer first,
+            # then one index per None in 'self.v_offsets'
+            INTERIOR_TYPE = self.lowleveltype.TO
+            assert len(INTERIOR_TYPE._names) == 1 + numitemoffsets
+            self.interior_fields = [
+                (flowmodel.Constant(name, lltype.Void),
+                 INTERIOR_TYPE._flds[name])
+                for name in INTERIOR_TYPE._names]
         else:
             self.lowleveltype = self.parentptrtype
+            self.interior_fields = None
 
     def getinteriorfieldargs(self, hop, v_self):
-        vlist = []
-        if None in self.v_offsets:
-            INTERIOR_TYPE = v_self.concretetype.TO
-            nameiter = iter(INTERIOR_TYPE._names)
-            name = nameiter.next()
-            vlist.append(
-                hop.genop('getfield',
-                          [v_self, flowmodel.Constant(name, lltype.Void)],
-                          resulttype=INTERIOR_TYPE._flds[name]))
-        else:
-            vlist.append(v_self)
+        if self.interior_fields is None:
+            return [v_self] + self.v_offsets
+        c_name, FIELD = self.interior_fields[0]
+        vlist = [hop.genop('getfield', [v_self, c_name], resulttype=FIELD)]
+        i = 1
         for v_offset in self.v_offsets:
             if v_offset is None:
-                name = nameiter.next()
-                vlist.append(
-                    hop.genop('getfield',
-                              [v_self, flowmodel.Constant(name, lltype.Void)],
-                              resulttype=INTERIOR_TYPE._flds[name]))
+                c_name, FIELD = self.interior_fields[i]
+                i += 1
+                vlist.append(hop.genop('getfield', [v_self, c_name],
+                                       resulttype=FIELD))
             else:
                 vlist.append(v_offset)
-        if None in self.v_offsets:
-            try:
-                nameiter.next()
-            except StopIteration:
-                pass
-            else:
-                assert False
         return vlist
 
     def rtype_len(self, hop):
@@ -122,6 +122,33 @@ class TestListImpl(BaseTestListImpl):
         assert l1 != l
         self.check_list(l1, [42, 43, 44, 45] * 4)
 
+    def test_rlist_concat_empty(self):
+        l = self.sample_list()
+        LIST = typeOf(l).TO
+        empty = ll_newlist(LIST, 0)
+        l1 = ll_concat(LIST, l, empty)
+        assert l1 != l
+        self.check_list(l1, [42, 43, 44, 45])
+        l1 = ll_concat(LIST, empty, l)
+        assert l1 != l
+        self.check_list(l1, [42, 43, 44, 45])
+        l1 = ll_concat(LIST, empty, empty)
+        assert l1 != empty
+        self.check_list(l1, [])
+
+    def test_rlist_resize_inplace(self):
+        l = self.sample_list()
+        ll_listdelslice_startonly(l, 2)
+        items = l.items
+        ll_rlist._ll_list_resize(l, len(items))
+        assert l.items == items
+        assert ll_len(l) == len(items)
+        ll_rlist._ll_list_resize(l, 3)
+        assert l.items != items
+        assert ll_len(l) == 3
+        assert ll_getitem_nonneg(l, 0) == 42
+        assert ll_getitem_nonneg(l, 1) == 43
+
     def test_rlist_delslice(self):
         l = self.sample_list()
         ll_listdelslice_startonly(l, 3)
@@ -585,6 +612,20 @@ class TestRlist(BaseRtypingTest):
         res = self.interpret(dummyfn, ())
         assert res == 235
 
+    def test_reverse_primitive(self):
+        def dummyfn(n):
+            l = [chr(ord('a') + i) for i in range(n)]
+            l.reverse()
+            f = [i * 0.5 for i in range(n)]
+            f.reverse()
+            return ''.join(l) + str(int(f[0] * 2))
+        res = self.interpret(dummyfn, [5])
+        assert self.ll_to_string(res) == 'edcba4'
+        res = self.interpret(dummyfn, [4])
+        assert self.ll_to_string(res) == 'dcba3'
+        res = self.interpret(dummyfn, [1])
+        assert self.ll_to_string(res) == 'a0'
+
     def test_reversed(self):
         klist = [1, 2, 3]
 
@@ -1715,3 +1756,16 @@ class TestRlist(BaseRtypingTest):
             assert op.opname == 'direct_call'
             seen += 1
         assert seen == 1
+
+    def test_alloc_and_set_primitive(self):
+        def fn(n, c):
+            l1 = [n] * n
+            l2 = [c] * (n + 1)
+            l3 = [n * 0.5] * (n + 2)
+            l1.append(-5)
+            return (len(l1) * 1000 + len(l2) * 100 + len(l3) * 10 +
+                    (l1[n - 1] == n) + (l2[n] == c) + (l3[n + 1] == n * 0.5) +
+                    (l1[0] == n) + (l2[0] == c) + (l3[0] == n * 0.5))
+        for n in [1, 2, 3, 7, 8, 9, 33]:
+            res = self.interpret(fn, [n, 'x'])
+            assert res == fn(n, 'x')